@@ -14,12 +14,14 @@ Note: Returned coordinates are relative values (0-1000), convert using:
 
 import asyncio
 import base64
+import functools
+import hashlib
 import json
 import os
 import re
+import struct
 import subprocess
 import sys
-import tempfile
 from datetime import datetime
 from io import BytesIO
 
@@ -32,11 +34,17 @@ except ImportError:
     sys.exit(1)
 
 try:
-    from openai import OpenAI
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient
 except ImportError:
     print("Please install openai: pip install openai", file=sys.stderr)
     sys.exit(1)
 
+try:
+    import httpx
+except ImportError:
+    print("Please install httpx: pip install httpx", file=sys.stderr)
+    sys.exit(1)
+
 try:
     from PIL import Image
 except ImportError:
@@ -48,15 +56,74 @@ BASE_URL = os.getenv("AUTOGLM_BASE_URL", "https://api.z.ai/api/paas/v4")
 MODEL = os.getenv("AUTOGLM_MODEL", "autoglm-phone-multilingual")
 APIKEY = os.getenv("AUTOGLM_APIKEY", "")
 
+# Overall aiAsk deadline; a single API attempt gives up just before it.
+# Retries after fast 429/5xx failures run until the outer deadline cancels them.
+REQUEST_TIMEOUT = 60
+API_TIMEOUT = 55
+API_MAX_RETRIES = 2
+
+# Screenshots are downscaled to this long edge and JPEG quality before upload
+SCREENSHOT_MAX_EDGE = 1024
+JPEG_QUALITY = 80
+
+# Raw screencap pixel formats (android.graphics.PixelFormat)
+# -> (Pillow mode, Pillow raw mode, bytes per pixel)
+_RAW_PIXEL_FORMATS = {
+    1: ("RGBA", "RGBA", 4),  # RGBA_8888
+    2: ("RGBA", "RGBX", 4),  # RGBX_8888
+    3: ("RGB", "RGB", 3),  # RGB_888
+    4: ("RGB", "BGR;16", 2),  # RGB_565
+    5: ("RGBA", "BGRA", 4),  # BGRA_8888
+}
+
+# Foreground activity line in `dumpsys activity activities`, e.g. "com.foo/.MainActivity"
+_RESUMED_ACTIVITY_RE = re.compile(r'(?:mResumedActivity|topResumedActivity)[^\n]*?(\S+)/\S+')
+
+# Raw screenshot, a separator line, then the foreground activity lines, in one adb call.
+# exec-out merges stderr into stdout, so screencap warnings are discarded on the device;
+# the trailing `true` keeps a grep without matches from failing the whole command.
+_CAPTURE_SEPARATOR = b"--autoglm-capture--\n"
+_CAPTURE_COMMAND = (
+    "screencap 2>/dev/null; echo --autoglm-capture--; "
+    "dumpsys activity activities | grep -E 'mResumedActivity|topResumedActivity'; true"
+)
+
 server = Server("autoglm-screen-analyzer")
 
+_client: AsyncOpenAI | None = None
+
+# Digest of the last raw screenshot and its encoded result, reused while the screen is unchanged
+_last_screenshot: tuple[bytes, tuple[str, int, int]] | None = None
+
+
+def get_client() -> AsyncOpenAI:
+    """Return the shared API client, so connections are reused across calls"""
+    global _client
+    if _client is None:
+        # Keep idle connections well past httpx's 5s default so TLS sessions
+        # survive the gaps between tool calls
+        http_client = DefaultAsyncHttpxClient(
+            limits=httpx.Limits(max_keepalive_connections=10, keepalive_expiry=120)
+        )
+        _client = AsyncOpenAI(
+            base_url=BASE_URL,
+            api_key=APIKEY,
+            timeout=API_TIMEOUT,
+            max_retries=API_MAX_RETRIES,
+            http_client=http_client,
+        )
+    return _client
+
 
 # ============ System Prompt ============
 def get_system_prompt() -> str:
     """Generate system prompt, consistent with phone_agent"""
-    today = datetime.today()
-    formatted_date = today.strftime("%Y-%m-%d, %A")
+    return _system_prompt_for(datetime.today().strftime("%Y-%m-%d, %A"))
+
 
+@functools.lru_cache(maxsize=2)
+def _system_prompt_for(formatted_date: str) -> str:
+    """Build the system prompt for a date, cached since it only changes daily"""
     return f"""The current date: {formatted_date}
 # Setup
 You are a professional Android operation agent assistant that can fulfill the user's high-level instructions. Given a screenshot of the Android interface at each step, you first analyze the situation, then plan the best course of action using Python-style pseudo-code.
@@ -127,47 +194,108 @@ REMEMBER:
 
 
 # ============ ADB Utilities ============
-def get_screenshot_with_info() -> tuple[str, int, int]:
-    """Get phone screenshot via ADB, returns (base64, width, height)"""
-    with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as f:
-        temp_path = f.name
+async def run_adb(*args: str) -> bytes:
+    """Run an adb command without blocking the event loop, returns stdout"""
+    cmd = ["adb", *args]
+    proc = await asyncio.create_subprocess_exec(
+        *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+    stdout, stderr = await proc.communicate()
+    returncode = await proc.wait()
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, cmd, stdout, stderr)
+    return stdout
+
+
+def encode_image(img: Image.Image) -> str:
+    """Downscale and encode a screenshot as a JPEG data URI"""
+    img = img.convert("RGB")
+    img.thumbnail((SCREENSHOT_MAX_EDGE, SCREENSHOT_MAX_EDGE), Image.Resampling.LANCZOS)
+    buffer = BytesIO()
+    img.save(buffer, "JPEG", quality=JPEG_QUALITY)
+
+    # Encode from the buffer's memory directly, skipping the getvalue() copy
+    return (b"data:image/jpeg;base64," + base64.b64encode(buffer.getbuffer())).decode("ascii")
+
+
+def encode_raw_screenshot(data: bytes) -> tuple[str, int, int] | None:
+    """Encode raw screencap output, returns (data URI, width, height) or None if unsupported"""
+    if len(data) < 12:
+        raise ValueError("Empty or truncated screencap output")
+
+    width, height, pixel_format = struct.unpack_from("<III", data)
+    if pixel_format not in _RAW_PIXEL_FORMATS:
+        return None
+    mode, raw_mode, bytes_per_pixel = _RAW_PIXEL_FORMATS[pixel_format]
+
+    # Header is 12 bytes, or 16 on Android 9+ which appends a color space field
+    header_size = len(data) - width * height * bytes_per_pixel
+    if header_size not in (12, 16):
+        raise ValueError("Unexpected screencap output size")
+
+    img = Image.frombuffer(mode, (width, height), data[header_size:], "raw", raw_mode, 0, 1)
+    # Only the uploaded pixels shrink, the returned size stays the device resolution
+    return encode_image(img), width, height
+
+
+def encode_png_screenshot(data: bytes) -> tuple[str, int, int]:
+    """Encode `screencap -p` output, returns (data URI, width, height)"""
+    img = Image.open(BytesIO(data))
+    width, height = img.size
+    return encode_image(img), width, height
+
+
+def screenshot_digest(data: bytes) -> bytes:
+    """Content digest of raw screencap output"""
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+async def encode_screenshot(data: bytes) -> tuple[str, int, int]:
+    """Encode raw screencap output, returns (data URI, width, height)"""
+    global _last_screenshot
+    digest = await asyncio.to_thread(screenshot_digest, data)
+    cached = _last_screenshot
+    if cached is not None and cached[0] == digest:
+        return cached[1]
+
+    # Pillow releases the GIL while resizing and encoding, so threads run in parallel
+    screenshot = await asyncio.to_thread(encode_raw_screenshot, data)
+    if screenshot is None:
+        # Pixel format not handled here, let the device encode a PNG instead
+        png_data = await run_adb("exec-out", "screencap -p 2>/dev/null")
+        screenshot = await asyncio.to_thread(encode_png_screenshot, png_data)
+    _last_screenshot = (digest, screenshot)
+    return screenshot
+
+
+def parse_current_app(output: bytes) -> str:
+    """Extract the foreground app package name from dumpsys output"""
+    # Match mResumedActivity or topResumedActivity
+    match = _RESUMED_ACTIVITY_RE.search(output.decode("utf-8", errors="replace"))
+    if match:
+        return match.group(1)
+    return "unknown"
 
-    try:
-        subprocess.run(
-            ["adb", "shell", "screencap", "-p", "/sdcard/screenshot-autoglm.png"],
-            check=True, capture_output=True
-        )
-        subprocess.run(
-            ["adb", "pull", "/sdcard/screenshot-autoglm.png", temp_path],
-            check=True, capture_output=True
-        )
 
-        # Read image to get dimensions
-        with open(temp_path, "rb") as f:
-            img_data = f.read()
-            img = Image.open(BytesIO(img_data))
-            width, height = img.size
+def split_capture_output(output: bytes) -> tuple[bytes, bytes]:
+    """Split batched capture output into (raw screenshot, dumpsys lines)"""
+    # The screenshot is binary, so split on the last separator
+    split = output.rfind(_CAPTURE_SEPARATOR)
+    if split < 0:
+        raise RuntimeError("Unexpected adb screen capture output")
+    return output[:split], output[split + len(_CAPTURE_SEPARATOR):]
 
-        return base64.b64encode(img_data).decode("utf-8"), width, height
-    finally:
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
 
+async def get_screen_info() -> tuple[str, int, int, str]:
+    """Get phone screenshot and foreground app via ADB, returns (data URI, width, height, app)"""
+    # Raw framebuffer skips the on-device PNG compression, and dumpsys is
+    # filtered on the device so only the matching lines cross USB
+    output = await run_adb("exec-out", _CAPTURE_COMMAND)
+    screenshot, activities = split_capture_output(output)
 
-def get_current_app() -> str:
-    """Get current foreground app package name"""
-    try:
-        result = subprocess.run(
-            ["adb", "shell", "dumpsys", "activity", "activities"],
-            capture_output=True, text=True, check=True
-        )
-        # Match mResumedActivity or topResumedActivity
-        match = re.search(r'(?:mResumedActivity|topResumedActivity).*?(\S+)/\S+', result.stdout)
-        if match:
-            return match.group(1)
-    except Exception:
-        pass
-    return "unknown"
+    screenshot_url, width, height = await encode_screenshot(screenshot)
+    current_app = parse_current_app(activities)
+    return screenshot_url, width, height, current_app
 
 
 # ============ Tool Definitions ============
@@ -215,57 +343,7 @@ async def call_tool(name: str, arguments: dict):
 
 
 # ============ AI Screen Analysis ============
-async def ai_ask(question: str):
-    """Call AutoGLM API to analyze screen"""
-
-    if not APIKEY:
-        return [TextContent(type="text", text="Error: AUTOGLM_APIKEY environment variable not set")]
-
-    if not question:
-        return [TextContent(type="text", text="Error: Question cannot be empty")]
-
-    loop = asyncio.get_event_loop()
-
-    def run_request():
-        """Execute API request in thread"""
-        # Get screenshot and screen info
-        screenshot_b64, width, height = get_screenshot_with_info()
-        current_app = get_current_app()
-
-        # Build screen info (consistent with phone_agent)
-        screen_info = json.dumps({"current_app": current_app}, ensure_ascii=False)
-        text_content = f"{question}\n\n{screen_info}"
-
-        # Call API
-        client = OpenAI(base_url=BASE_URL, api_key=APIKEY)
-
-        response = client.chat.completions.create(
-            model=MODEL,
-            messages=[
-                {
-                    "role": "system",
-                    "content": get_system_prompt()
-                },
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "image_url",
-                            "image_url": {"url": f"data:image/png;base64,{screenshot_b64}"}
-                        },
-                        {
-                            "type": "text",
-                            "text": text_content
-                        }
-                    ]
-                }
-            ],
-        )
-
-        result = response.choices[0].message.content
-
-        # Add screen info for coordinate conversion
-        return f"""
+_RESULT_TEMPLATE = """
 ---
 ⚠️ IMPORTANT: Coordinates below are relative (0-1000 scale), NOT pixels!
 
@@ -277,25 +355,87 @@ Screen Info:
 
 {result}"""
 
+
+async def analyze_screen(question: str) -> str:
+    """Capture the screen and ask the model about it"""
+    # Get screenshot and screen info
+    screenshot_url, width, height, current_app = await get_screen_info()
+
+    # Build screen info (consistent with phone_agent)
+    screen_info = json.dumps({"current_app": current_app}, ensure_ascii=False)
+    text_content = f"{question}\n\n{screen_info}"
+
+    # Call API
+    response = await get_client().chat.completions.create(
+        model=MODEL,
+        messages=[
+            {
+                "role": "system",
+                "content": get_system_prompt()
+            },
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "image_url",
+                        "image_url": {"url": screenshot_url}
+                    },
+                    {
+                        "type": "text",
+                        "text": text_content
+                    }
+                ]
+            }
+        ],
+    )
+
+    result = response.choices[0].message.content
+
+    # Add screen info for coordinate conversion
+    return _RESULT_TEMPLATE.format(width=width, height=height, result=result)
+
+
+async def ai_ask(question: str):
+    """Call AutoGLM API to analyze screen"""
+
+    if not APIKEY:
+        return [TextContent(type="text", text="Error: AUTOGLM_APIKEY environment variable not set")]
+
+    if not question:
+        return [TextContent(type="text", text="Error: Question cannot be empty")]
+
     try:
-        result = await asyncio.wait_for(
-            loop.run_in_executor(None, run_request),
-            timeout=60
-        )
+        result = await asyncio.wait_for(analyze_screen(question), timeout=REQUEST_TIMEOUT)
         return [TextContent(type="text", text=result)]
 
     except asyncio.TimeoutError:
-        return [TextContent(type="text", text="Error: Request timeout (60 seconds)")]
+        return [
+            TextContent(type="text", text=f"Error: Request timeout ({REQUEST_TIMEOUT} seconds)")
+        ]
 
     except Exception as e:
         return [TextContent(type="text", text=f"Error: {str(e)}")]
 
 
 # ============ Start Server ============
+async def warm_up_client() -> None:
+    """Open a pooled API connection ahead of the first tool call"""
+    try:
+        # Any response will do, the point is the TLS handshake
+        await get_client().models.list()
+    except Exception:
+        pass
+
+
 async def _run_server():
     """Start MCP server"""
-    async with stdio_server() as (read_stream, write_stream):
-        await server.run(read_stream, write_stream, server.create_initialization_options())
+    warm_up = asyncio.create_task(warm_up_client()) if APIKEY else None
+    try:
+        async with stdio_server() as (read_stream, write_stream):
+            await server.run(read_stream, write_stream, server.create_initialization_options())
+    finally:
+        if warm_up is not None:
+            warm_up.cancel()
 
 
 def main():
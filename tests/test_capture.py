@@ -0,0 +1,124 @@
+"""Tests for parsing the batched adb screen capture output"""
+
+import base64
+import struct
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from autoglm_mcp.server import (
+    _CAPTURE_SEPARATOR,
+    encode_png_screenshot,
+    encode_raw_screenshot,
+    parse_current_app,
+    split_capture_output,
+)
+
+ACTIVITY_LINE = (
+    b"  topResumedActivity=ActivityRecord{a1b2c3 u0 com.android.settings/.Settings t12}\n"
+)
+
+
+# Opaque red pixel in each supported raw pixel format
+RED_PIXELS = {
+    1: bytes([255, 0, 0, 255]),
+    2: bytes([255, 0, 0, 0]),
+    3: bytes([255, 0, 0]),
+    4: struct.pack("<H", 0xF800),
+    5: bytes([0, 0, 255, 255]),
+}
+
+
+def make_raw_screenshot(width: int, height: int, header_size: int = 16, pixel_format: int = 1):
+    """Build raw screencap output filled with opaque red pixels"""
+    header = struct.pack("<III", width, height, pixel_format)
+    if header_size == 16:
+        header += struct.pack("<I", 0)
+    return header + RED_PIXELS.get(pixel_format, bytes(4)) * (width * height)
+
+
+def assert_red(img: Image.Image):
+    red, green, blue = img.convert("RGB").getpixel((img.width // 2, img.height // 2))
+    assert red > 240 and green < 16 and blue < 16
+
+
+def decode_data_uri(data_uri: str) -> Image.Image:
+    prefix = "data:image/jpeg;base64,"
+    assert data_uri.startswith(prefix)
+    return Image.open(BytesIO(base64.b64decode(data_uri[len(prefix):])))
+
+
+def test_split_capture_output():
+    raw = make_raw_screenshot(4, 4)
+    screenshot, activities = split_capture_output(raw + _CAPTURE_SEPARATOR + ACTIVITY_LINE)
+    assert screenshot == raw
+    assert activities == ACTIVITY_LINE
+
+
+def test_split_capture_output_separator_in_pixels():
+    raw = make_raw_screenshot(4, 4) + _CAPTURE_SEPARATOR
+    screenshot, activities = split_capture_output(raw + _CAPTURE_SEPARATOR + ACTIVITY_LINE)
+    assert screenshot == raw
+    assert activities == ACTIVITY_LINE
+
+
+def test_split_capture_output_missing_separator():
+    with pytest.raises(RuntimeError):
+        split_capture_output(make_raw_screenshot(4, 4))
+
+
+@pytest.mark.parametrize("header_size", [12, 16])
+def test_encode_raw_screenshot_header_sizes(header_size):
+    data_uri, width, height = encode_raw_screenshot(make_raw_screenshot(30, 50, header_size))
+    assert (width, height) == (30, 50)
+    img = decode_data_uri(data_uri)
+    assert img.size == (30, 50)
+    assert_red(img)
+
+
+@pytest.mark.parametrize("pixel_format", sorted(RED_PIXELS))
+def test_encode_raw_screenshot_pixel_formats(pixel_format):
+    data_uri, width, height = encode_raw_screenshot(make_raw_screenshot(30, 50, 16, pixel_format))
+    assert (width, height) == (30, 50)
+    assert_red(decode_data_uri(data_uri))
+
+
+def test_encode_raw_screenshot_downscales_but_reports_device_size():
+    data_uri, width, height = encode_raw_screenshot(make_raw_screenshot(2048, 64))
+    assert (width, height) == (2048, 64)
+    assert decode_data_uri(data_uri).size == (1024, 32)
+
+
+def test_encode_raw_screenshot_empty_capture():
+    screenshot, _ = split_capture_output(_CAPTURE_SEPARATOR + ACTIVITY_LINE)
+    with pytest.raises(ValueError, match="Empty or truncated"):
+        encode_raw_screenshot(screenshot)
+
+
+def test_encode_raw_screenshot_unexpected_size():
+    with pytest.raises(ValueError, match="Unexpected screencap output size"):
+        encode_raw_screenshot(make_raw_screenshot(4, 4) + b"warning on stderr\n")
+
+
+def test_encode_raw_screenshot_unsupported_format():
+    assert encode_raw_screenshot(make_raw_screenshot(4, 4, pixel_format=0x16)) is None
+
+
+def test_encode_png_screenshot():
+    buffer = BytesIO()
+    Image.new("RGB", (2048, 64), (255, 0, 0)).save(buffer, "PNG")
+    data_uri, width, height = encode_png_screenshot(buffer.getvalue())
+    assert (width, height) == (2048, 64)
+    img = decode_data_uri(data_uri)
+    assert img.size == (1024, 32)
+    assert_red(img)
+
+
+def test_parse_current_app():
+    assert parse_current_app(ACTIVITY_LINE) == "com.android.settings"
+
+
+def test_parse_current_app_no_match():
+    _, activities = split_capture_output(make_raw_screenshot(4, 4) + _CAPTURE_SEPARATOR)
+    assert parse_current_app(activities) == "unknown"